@@ -16,8 +16,11 @@ load_dotenv()
 
 from playwright.async_api import Page
 
-from gsheets_writer import HEADERS, open_sheet, month_tab_title
-from login_manager import login_and_get_context
+from gsheets_writer import HEADERS, open_sheet, month_tab_title, update_cells
+from login_manager import close_browser, login_and_get_context
+
+# Filled cells are written to the sheet in batches of this many
+WRITE_BATCH = 25
 
 try:
     from zoneinfo import ZoneInfo
@@ -161,6 +164,7 @@ async def backfill_company_names(month_text: str, year: int):
     company_col = headers.index("Company Name") + 1  # 1-based
 
     filled = 0
+    pending_cells = []
     try:
         for i, order in enumerate(orders, 1):
             order_id = order["order_number"]
@@ -171,16 +175,21 @@ async def backfill_company_names(month_text: str, year: int):
             company = await fetch_company_name(page, context, order_id)
 
             if company:
-                ws.update_cell(row_idx, company_col, company)
+                pending_cells.append((row_idx, company_col, company))
+                if len(pending_cells) >= WRITE_BATCH:
+                    update_cells(ws, pending_cells)
+                    pending_cells.clear()
                 print(f"-> {company}")
                 filled += 1
             else:
                 print("-> not found")
 
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
+        try:
+            update_cells(ws, pending_cells)
+        except Exception as e:
+            print(f"  ⚠️ Could not write last {len(pending_cells)} cell(s): {e}")
+        await close_browser(browser, context, pw)
 
     print(f"\n  Filled {filled}/{len(orders)} company names")
 
@@ -13,7 +13,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from gsheets_writer import open_sheet, month_tab_title
-from login_manager import login_and_get_context
+from login_manager import close_browser, login_and_get_context
 from credential_manager import CredentialManager
 
 
@@ -173,9 +173,7 @@ async def backfill_custids(month_text: str, year: int):
             ws.batch_update(batch, value_input_option="USER_ENTERED")
 
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
+        await close_browser(browser, context, pw)
 
     print(f"\n  Filled {filled}/{len(orders)} Cust IDs")
 
@@ -13,8 +13,11 @@ load_dotenv()
 
 from playwright.async_api import Page
 
-from gsheets_writer import open_sheet, month_tab_title
-from login_manager import login_and_get_context
+from gsheets_writer import open_sheet, month_tab_title, update_cells
+from login_manager import close_browser, login_and_get_context
+
+# Filled cells are written to the sheet in batches of this many
+WRITE_BATCH = 25
 
 
 def get_orders_missing_device(ws) -> List[Dict]:
@@ -161,6 +164,7 @@ async def backfill_devices(month_text: str, year: int):
     device_col = headers.index("Device") + 1  # 1-based
 
     filled = 0
+    pending_cells = []
     try:
         for i, order in enumerate(orders, 1):
             order_id = order["order_number"]
@@ -171,16 +175,21 @@ async def backfill_devices(month_text: str, year: int):
             device = await fetch_device_name(context, order_id)
 
             if device:
-                ws.update_cell(row_idx, device_col, device)
+                pending_cells.append((row_idx, device_col, device))
+                if len(pending_cells) >= WRITE_BATCH:
+                    update_cells(ws, pending_cells)
+                    pending_cells.clear()
                 print(f"-> {device}")
                 filled += 1
             else:
                 print("-> not found")
 
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
+        try:
+            update_cells(ws, pending_cells)
+        except Exception as e:
+            print(f"  ⚠️ Could not write last {len(pending_cells)} cell(s): {e}")
+        await close_browser(browser, context, pw)
 
     print(f"\n  Filled {filled}/{len(orders)} device names")
 
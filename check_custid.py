@@ -229,7 +229,7 @@ async def check_custids_multi_month(
     Args:
         months: list of (month_text, year) tuples
     """
-    from login_manager import login_and_get_context
+    from login_manager import close_browser, login_and_get_context
 
     browser, context, pw, page = await login_and_get_context(username, password)
 
@@ -287,9 +287,7 @@ async def check_custids_multi_month(
                 all_results[f"{month_text} {year}"] = {"error": str(e)}
 
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
+        await close_browser(browser, context, pw)
 
     # Overall summary
     print(f"\n{'=' * 70}")
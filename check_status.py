@@ -437,31 +437,21 @@ async def query_via_order_detail(target, context, csrf_token: str, order_id: str
     Last resort fallback: open order detail to get custId, then call qrySubsPageTree.
     Returns subsList entries with prodStateName.
     """
-    captured = {}
-
-    async def intercept(response):
-        try:
-            if "getCeeOrderDetail" in response.url and response.status == 200:
-                data = await response.json()
-                if isinstance(data, dict) and data.get("data"):
-                    cust_info = data["data"].get("custInfo", {}) or {}
-                    captured["custId"] = cust_info.get("custId", "")
-        except Exception:
-            pass
-
+    cust_id = ""
     p = await context.new_page()
-    p.on("response", intercept)
 
     try:
         url = f"https://dealer.unifi.com.my/esales/h5/onBoarding/OrderDetails?custOrderId={order_id}&custOrderNbr={order_id}"
-        await p.goto(url, wait_until="networkidle", timeout=60000)
-
-        for _ in range(20):
-            if "custId" in captured:
-                break
-            await p.wait_for_timeout(500)
-
-        await p.wait_for_timeout(500)
+        # Resolve on the getCeeOrderDetail response itself (no listener, no networkidle + polling)
+        async with p.expect_response(
+            lambda r: "getCeeOrderDetail" in r.url and r.status == 200,
+            timeout=60000,
+        ) as resp_info:
+            await p.goto(url, wait_until="commit", timeout=60000)
+        data = await (await resp_info.value).json()
+        if isinstance(data, dict) and data.get("data"):
+            cust_info = data["data"].get("custInfo", {}) or {}
+            cust_id = cust_info.get("custId", "")
     except Exception as e:
         print(f"    Error fetching order detail: {e}")
     finally:
@@ -470,7 +460,6 @@ async def query_via_order_detail(target, context, csrf_token: str, order_id: str
         except Exception:
             pass
 
-    cust_id = captured.get("custId", "")
     if not cust_id:
         return []
 
@@ -922,25 +911,20 @@ async def check_all_statuses(
         except Exception:
             print(f"  Tab '{tab_title}' not found — skipping")
             return {"total": 0, "checked": 0, "not_found": 0, "errors": 0, "skipped": True}
-        from gsheets_writer import HEADERS
-        first_row = ws.row_values(1)
-        if first_row != HEADERS:
-            ws.update([HEADERS], "A1")
-            print("  Updated sheet headers with new columns")
         print(f"  Sheet tab: {tab_title}")
-    else:
-        from gsheets_writer import HEADERS
-        first_row = ws.row_values(1)
-        if first_row != HEADERS:
-            ws.update([HEADERS], "A1")
-            print("  Updated sheet headers with new columns")
+
+    # Read the header row once: used for the header check and by the batch writer
+    from gsheets_writer import HEADERS
+    sheet_headers = ws.row_values(1)
+    if sheet_headers != HEADERS:
+        ws.update([HEADERS], "A1")
+        print("  Updated sheet headers with new columns")
+        sheet_headers = list(HEADERS)
 
     # Get orders to check
     orders, cancelled_rows = get_orders_to_check(ws, only_empty=only_empty)
     print(f"  Orders to check: {len(orders)}")
 
-    # Cache the headers once
-    sheet_headers = ws.row_values(1)
     writer = StatusBatchWriter(ws, sheet_headers)
 
     # Fill cancelled orders with "-" immediately
@@ -1267,7 +1251,7 @@ async def check_status_standalone(
     """
     Standalone entry point: logs in, checks statuses for one month, closes browser.
     """
-    from login_manager import login_and_get_context
+    from login_manager import close_browser, login_and_get_context
 
     browser, context, pw, page = await login_and_get_context(username, password)
 
@@ -1275,9 +1259,7 @@ async def check_status_standalone(
         result = await check_all_statuses(page, month_text, year)
         return result
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
+        await close_browser(browser, context, pw)
 
 
 async def check_status_standalone_empty(
@@ -1289,7 +1271,7 @@ async def check_status_standalone_empty(
     """
     Standalone entry point: only checks orders that don't have a Status yet.
     """
-    from login_manager import login_and_get_context
+    from login_manager import close_browser, login_and_get_context
 
     browser, context, pw, page = await login_and_get_context(username, password)
 
@@ -1297,9 +1279,7 @@ async def check_status_standalone_empty(
         result = await check_all_statuses(page, month_text, year, only_empty=True)
         return result
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
+        await close_browser(browser, context, pw)
 
 
 async def check_status_multi_month(
@@ -1312,7 +1292,7 @@ async def check_status_multi_month(
     Args:
         months: list of (month_text, year) tuples, e.g. [("Jun", 2026), ("May", 2026), ...]
     """
-    from login_manager import login_and_get_context
+    from login_manager import close_browser, login_and_get_context
 
     browser, context, pw, page = await login_and_get_context(username, password)
 
@@ -1332,9 +1312,7 @@ async def check_status_multi_month(
                 print(f"  Error checking {month_text} {year}: {e}")
                 all_results[f"{month_text} {year}"] = {"error": str(e)}
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
+        await close_browser(browser, context, pw)
 
     # Print overall summary
     print(f"\n{'=' * 70}")
@@ -6,6 +6,10 @@ Handles month ranges and date format standardization.
 
 from datetime import datetime, timedelta
 
+_MONTH_ABBRS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_MONTH_NUMS = {abbr: i for i, abbr in enumerate(_MONTH_ABBRS, 1)}
+
 
 def month_range_yyyymmddhhmmss(month_text, year):
     """
@@ -58,6 +62,29 @@ def month_range_yyyymmddhhmmss(month_text, year):
     return start_date.strftime("%Y%m%d%H%M%S"), end_date.strftime("%Y%m%d%H%M%S")
 
 
+def ui_datetime_parts(date_str):
+    """
+    Split a UI date like "1 Dec 2025 1:05" or "01 Dec 2025 13:00:00" without strptime.
+    Returns (year, month, day, hour, minute, second), or None if the text has another shape.
+    """
+    parts = date_str.split()
+    if len(parts) != 4:
+        return None
+    day, mon, year, clock = parts
+    month = _MONTH_NUMS.get(mon)
+    hms = clock.split(":")
+    if month is None or len(year) != 4 or len(hms) not in (2, 3):
+        return None
+    try:
+        d, y, h, mi = int(day), int(year), int(hms[0]), int(hms[1])
+        sec = int(hms[2]) if len(hms) == 3 else 0
+    except ValueError:
+        return None
+    if not (1 <= d <= 31 and h < 24 and mi < 60 and sec < 60):
+        return None
+    return y, month, d, h, mi, sec
+
+
 def standardize_date(date_str):
     """
     Clean messy dates into a strict, zero-padded format for sorting.
@@ -72,6 +99,12 @@ def standardize_date(date_str):
 
     date_str = date_str.strip()
 
+    # Fast path for the UI's own "D Mon YYYY H:MM[:SS]" dates
+    fields = ui_datetime_parts(date_str)
+    if fields:
+        y, month, d, h, mi, _ = fields
+        return f"{d:02d} {_MONTH_ABBRS[month - 1]} {y} {h:02d}:{mi:02d}"
+
     # Formats to try parsing FROM
     input_formats = [
         "%d %b %Y %H:%M:%S",  # 01 Dec 2025 13:00:00
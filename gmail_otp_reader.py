@@ -6,6 +6,7 @@ Handles forwarded SMS like: "Unifi: Your OTP is 641776"
 import base64
 import os
 import re
+import threading
 import time
 
 from google.auth.transport.requests import Request
@@ -16,6 +17,16 @@ from googleapiclient.discovery import build
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 ALLOW_BROWSER_AUTH = os.getenv("GMAIL_ALLOW_BROWSER", "0") == "1"
 
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_OTP_PATTERNS = tuple(
+    re.compile(p, re.IGNORECASE)
+    for p in (
+        r"proceed\s+(\d{6})",  # Matches "proceed 655631"
+        r"OTP.*?(\d{6})",  # Matches "OTP... 655631"
+        r"\b(\d{6})\b",  # Fallback: Matches ANY standalone 6 digits
+    )
+)
+
 
 class GmailOTPReader:
     def __init__(self):
@@ -86,6 +97,12 @@ class GmailOTPReader:
 
         start_time = time.time() - 60
         check_count = 0
+        # Messages already fetched and checked - each poll only downloads new ones
+        seen_ids = set()
+        # Next time to print a "still waiting" line (every 30s, however long each check takes)
+        next_progress = time.time() + 30
+        # Poll delay: starts at 1s and backs off (x1.6) to at most every 10s
+        delay = 1.0
 
         while time.time() - start_time < max_wait:
             try:
@@ -107,6 +124,8 @@ class GmailOTPReader:
                     # Check each message for OTP
                     for msg_data in messages:
                         msg_id = msg_data["id"]
+                        if msg_id in seen_ids:
+                            continue
                         message = (
                             self.service.users()
                             .messages()
@@ -122,6 +141,7 @@ class GmailOTPReader:
                             print(
                                 f"  Skipping old email (from {int(time.time() - msg_timestamp)}s ago)"
                             )
+                            seen_ids.add(msg_id)
                             continue
 
                         # Get subject and body
@@ -136,6 +156,8 @@ class GmailOTPReader:
 
                         # Extract OTP
                         otp = self._extract_otp(full_text)
+                        # Only mark it seen once fetched and checked - a failed fetch is retried
+                        seen_ids.add(msg_id)
 
                         if otp:
                             print(
@@ -144,19 +166,17 @@ class GmailOTPReader:
                             return otp
 
                 # Progress indicator
-                elapsed = int(time.time() - start_time)
-                if elapsed % 30 == 0 and elapsed > 0:
+                now = time.time()
+                elapsed = int(now - start_time)
+                if now >= next_progress:
                     print(
                         f"Still waiting... ({elapsed}s elapsed, check #{check_count})"
                     )
+                    next_progress = now + 30
 
                 # Wait before next check (exponential backoff)
-                if elapsed < 60:
-                    time.sleep(3)  # Check every 3 seconds for first minute
-                elif elapsed < 300:
-                    time.sleep(10)  # Every 10 seconds for first 5 minutes
-                else:
-                    time.sleep(30)  # Every 30 seconds after that
+                time.sleep(delay)
+                delay = min(delay * 1.6, 10.0)
 
             except Exception as e:
                 print(f"Error reading email: {e}")
@@ -214,20 +234,12 @@ class GmailOTPReader:
 
     def _extract_otp(self, text):
         """Clean HTML and extract the 6-digit OTP"""
-        import re
-
         # 1. Strip all HTML tags out so we just have raw text
-        clean_text = re.sub(r"<[^>]+>", " ", text)
+        clean_text = _HTML_TAG_RE.sub(" ", text)
 
         # 2. Extract the OTP
-        patterns = [
-            r"proceed\s+(\d{6})",  # Matches "proceed 655631"
-            r"OTP.*?(\d{6})",  # Matches "OTP... 655631"
-            r"\b(\d{6})\b",  # Fallback: Matches ANY standalone 6 digits
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, clean_text, re.IGNORECASE)
+        for pattern in _OTP_PATTERNS:
+            match = pattern.search(clean_text)
             if match:
                 otp = match.group(1)
                 # Verify it's actually 6 digits
@@ -237,9 +249,22 @@ class GmailOTPReader:
         return None
 
 
+# Authenticated reader per thread (built on first use) - the googleapiclient service
+# sits on one httplib2.Http, which isn't thread-safe, and api_server logs in from several threads
+_local = threading.local()
+
+
+def _get_reader():
+    """Return this thread's reader, authenticating only the first time"""
+    reader = getattr(_local, "reader", None)
+    if reader is None or reader.service is None:
+        reader = _local.reader = GmailOTPReader()
+    return reader
+
+
 # Standalone function for easy import
 def get_latest_otp(sender_filter="@unifi.com.my", max_age_seconds=1800):
-    reader = GmailOTPReader()
+    reader = _get_reader()
     return reader.get_latest_otp(
         sender_filter=sender_filter, wait_seconds=60, max_wait=max_age_seconds
     )
@@ -1,11 +1,15 @@
 # gsheets_writer.py - Month-based tabs version
+import hashlib
 import os
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import gspread
 from gspread.utils import rowcol_to_a1
 
+from date_utils import ui_datetime_parts
+
 # UPDATED HEADERS with Org Code and Organization Name
 HEADERS = [
     "Order Number",
@@ -32,6 +36,11 @@ HEADERS = [
     "Status Scrape Date",
 ]
 
+# Tabs whose header/formatting was already verified for the current HEADERS
+# (one "<spreadsheet id>:<sheet id>:<headers hash>" per line) - lets ensure_tab skip its API calls
+HEADER_CACHE_PATH = "config/.sheet_header_ok"
+_HEADERS_HASH = hashlib.blake2b(",".join(HEADERS).encode(), digest_size=16).hexdigest()
+
 MONTH_ORDER = [
     "Jan",
     "Feb",
@@ -48,12 +57,22 @@ MONTH_ORDER = [
 ]
 
 
+# Authorized client and opened spreadsheets, reused across open_sheet() calls
+_gc = None
+_spreads: Dict[str, "gspread.Spreadsheet"] = {}
+
+
 def open_sheet():
+    global _gc
     sid = os.environ.get("GOOGLE_SHEETS_SPREADSHEET_ID")
     if not sid:
         raise RuntimeError("GOOGLE_SHEETS_SPREADSHEET_ID not set")
-    gc = gspread.service_account(filename="service_account.json")
-    return gc.open_by_key(sid)
+    spread = _spreads.get(sid)
+    if spread is None:
+        if _gc is None:
+            _gc = gspread.service_account(filename="service_account.json")
+        spread = _spreads[sid] = _gc.open_by_key(sid)
+    return spread
 
 
 def today_tab_title():
@@ -170,6 +189,27 @@ def ensure_tabs_sorted_by_month(spread):
         print(f"⚠️ Warning: Could not sort tabs by month: {e}")
 
 
+def _header_cache_key(spread, ws) -> str:
+    return f"{spread.id}:{ws.id}:{_HEADERS_HASH}"
+
+
+def _header_verified(key: str) -> bool:
+    try:
+        with open(HEADER_CACHE_PATH, "r") as f:
+            return any(line.strip() == key for line in f)
+    except OSError:
+        return False
+
+
+def _remember_header_verified(key: str):
+    try:
+        os.makedirs(os.path.dirname(HEADER_CACHE_PATH), exist_ok=True)
+        with open(HEADER_CACHE_PATH, "a") as f:
+            f.write(key + "\n")
+    except OSError:
+        pass  # Cache is only an optimisation
+
+
 def ensure_tab(spread, title: str):
     try:
         ws = spread.worksheet(title)
@@ -179,6 +219,11 @@ def ensure_tab(spread, title: str):
         # Format ONLY header row: bold text
         ws.format("1:1", {"textFormat": {"bold": True}, "horizontalAlignment": "LEFT"})
 
+    # Header + formatting already checked for this tab and these HEADERS on an earlier run
+    cache_key = _header_cache_key(spread, ws)
+    if _header_verified(cache_key):
+        return ws
+
     # ensure headers present
     first = ws.row_values(1)
     if first != HEADERS:
@@ -205,6 +250,7 @@ def ensure_tab(spread, title: str):
     except:
         pass  # Don't fail if we can't reset formatting
 
+    _remember_header_verified(cache_key)
     return ws
 
 
@@ -213,7 +259,11 @@ def build_index(ws) -> Dict[str, int]:
     Return dict of order_number -> row_index (1-based).
     Strips legacy apostrophes for backwards compatibility.
     """
-    records = ws.get_all_values()
+    return _index_records(ws.get_all_values())
+
+
+def _index_records(records) -> Dict[str, int]:
+    """build_index() over already-fetched get_all_values() records"""
     idx = {}
     for i in range(1, len(records)):  # skip header (row 0 in list = row 1 in sheet)
         row = records[i]
@@ -227,6 +277,24 @@ def build_index(ws) -> Dict[str, int]:
     return idx
 
 
+def update_cells(ws, updates: List[Tuple[int, int, str]], attempts: int = 3):
+    """
+    Write many (row, col, value) cells in one batch request instead of one update_cell each.
+    Retries with exponential backoff; re-raises after the last attempt.
+    """
+    if not updates:
+        return
+    cells = [gspread.Cell(row, col, value) for row, col, value in updates]
+    for attempt in range(attempts):
+        try:
+            ws.update_cells(cells, value_input_option="USER_ENTERED")
+            return
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(2**attempt)
+
+
 def upsert_rows(ws, rows: List[Dict[str, str]]):
     """
     Upsert by order_number.
@@ -235,7 +303,8 @@ def upsert_rows(ws, rows: List[Dict[str, str]]):
     Ensures data rows are formatted as normal (not bold).
     Ensures Order Number is formatted as TEXT to prevent scientific notation.
     """
-    index = build_index(ws)
+    records = ws.get_all_values()
+    index = _index_records(records)
     updates = []
     to_append = []
 
@@ -264,41 +333,46 @@ def upsert_rows(ws, rows: List[Dict[str, str]]):
         else:
             to_append.append(values)
 
-    # batch updates
-    if updates:
-        ws.batch_update(
-            [{"range": rng, "values": vals} for rng, vals in updates],
-            value_input_option="USER_ENTERED",
+    if to_append:
+        # New rows go right after the current last row (already known from the index read),
+        # written in the same values request as the updates
+        new_start_row = len(records) + 1
+        new_end_row = len(records) + len(to_append)
+        if new_end_row > ws.row_count:
+            ws.add_rows(new_end_row - ws.row_count)
+        updates.append(
+            (
+                f"A{new_start_row}:{rowcol_to_a1(new_end_row, len(HEADERS))}",
+                to_append,
+            )
         )
 
-        # Make sure updated rows are NOT bold
-        for rng, _ in updates:
-            try:
-                ws.format(
-                    rng, {"textFormat": {"bold": False}, "horizontalAlignment": "LEFT"}
-                )
-            except:
-                pass
-
-    if to_append:
-        # Get current last row before appending
-        current_rows = len(ws.get_all_values())
+    if not updates:
+        return
 
-        ws.append_rows(to_append, value_input_option="USER_ENTERED")
+    # One values request for updated + new rows
+    ws.batch_update(
+        [{"range": rng, "values": vals} for rng, vals in updates],
+        value_input_option="USER_ENTERED",
+    )
 
-        # Format the newly appended rows as NOT bold
-        try:
-            new_start_row = current_rows + 1
-            new_end_row = current_rows + len(to_append)
-            if new_end_row >= new_start_row:
-                new_range = f"{new_start_row}:{new_end_row}"
-                ws.format(
-                    new_range,
-                    {"textFormat": {"bold": False}, "horizontalAlignment": "LEFT"},
-                )
-        except Exception as e:
-            # If formatting fails, don't crash the whole operation
-            print(f"⚠️ Could not format new rows: {e}")
+    # Make sure written rows are NOT bold (one request for all of them)
+    try:
+        ws.batch_format(
+            [
+                {
+                    "range": rng,
+                    "format": {
+                        "textFormat": {"bold": False},
+                        "horizontalAlignment": "LEFT",
+                    },
+                }
+                for rng, _ in updates
+            ]
+        )
+    except Exception as e:
+        # If formatting fails, don't crash the whole operation
+        print(f"⚠️ Could not format written rows: {e}")
 
 
 def fix_existing_formatting(ws):
@@ -382,8 +456,10 @@ def sort_tab_by_created_date(ws, descending=True):
                     return (0, 0, 0, 0, 0, 0)  # Empty dates go to end
 
                 date_str = row[created_date_idx].strip()
-                # Format: "31 Oct 2025 14:29:30" or "31 Oct 2025 14:29"
-                from datetime import datetime
+                # Format: "31 Oct 2025 14:29:30" or "31 Oct 2025 14:29" - split, no strptime
+                parts = ui_datetime_parts(date_str)
+                if parts:
+                    return parts
 
                 for fmt in ["%d %b %Y %H:%M:%S", "%d %b %Y %H:%M"]:
                     try:
@@ -152,8 +152,22 @@ async def _launch_browser_safe():
             ignore_default_args=["--enable-automation"],
         )
     except Exception as e:
+        await pw.stop()
         raise RuntimeError(f"PLAYWRIGHT_BROWSER_LAUNCH_FAILED: {e}") from e
 
+    try:
+        context, page = await _new_stealth_page(browser)
+    except BaseException:
+        # Don't leave Chromium / the Playwright driver running if setup fails
+        await close_browser(browser, None, pw)
+        raise
+
+    print("[BROWSER] engine=playwright chromium (Headed + Stealth + surgical patch)")
+    return pw, browser, context, page
+
+
+async def _new_stealth_page(browser):
+    """Create the patched, stealthed context and its first page"""
     context = await browser.new_context(
         viewport={"width": 1280, "height": 800},
         user_agent=(
@@ -223,9 +237,7 @@ async def _launch_browser_safe():
             pass
 
     page.on("framenavigated", on_frame_navigated)
-
-    print("[BROWSER] engine=playwright chromium (Headed + Stealth + surgical patch)")
-    return pw, browser, context, page
+    return context, page
 
 
 async def load_session(context):
@@ -271,19 +283,47 @@ async def save_session(context):
     cookies = await context.cookies()
     payload = {"cookies": cookies, "last_login": time.time()}
     with open(SESSION_PATH, "w") as f:
-        json.dump(payload, f)
+        json.dump(payload, f, separators=(",", ":"))
     print("Session cookies saved")
 
 
+async def close_browser(browser, context, pw):
+    """Tear down context -> browser -> Playwright; later steps still run if an earlier one fails."""
+    try:
+        if context is not None:
+            await context.close()
+    finally:
+        try:
+            if browser is not None:
+                await browser.close()
+        finally:
+            if pw is not None:
+                await pw.stop()
+
+
 async def login_and_get_context(username: str, password: str):
     pw, browser, context, page = await _launch_browser_safe()
+    try:
+        return await _login(pw, browser, context, page, username, password)
+    except BaseException:
+        # Don't leave a Chromium process behind when login fails
+        await close_browser(browser, context, pw)
+        raise
 
+
+async def _login(pw, browser, context, page, username: str, password: str):
     session = await load_session(context)
     if session:
         try:
             print("Testing cached session...")
             await page.goto(HISTORY_URL, timeout=30000, wait_until="domcontentloaded")
-            await page.wait_for_timeout(3000)
+            # Either the app (History tab) or the login form shows up - whichever comes first
+            try:
+                await page.locator('text="History"').or_(
+                    page.locator("input#login-form_staffCode")
+                ).first.wait_for(state="visible", timeout=15000)
+            except Exception:
+                pass
 
             if (
                 "login" in page.url.lower()
@@ -294,7 +334,12 @@ async def login_and_get_context(username: str, password: str):
             else:
                 try:
                     await page.locator('text="History"').last.click(timeout=5000)
-                    await page.wait_for_timeout(1000)
+                    try:
+                        await page.locator(".ant-picker").first.wait_for(
+                            state="visible", timeout=5000
+                        )
+                    except Exception:
+                        pass
                     if await page.locator(".ant-picker").count() > 0:
                         print("✅ Cached session valid - using it!")
                         return browser, context, pw, page
@@ -321,7 +366,6 @@ async def login_and_get_context(username: str, password: str):
     except Exception:
         print("  ⚠️ OTP field not found, waiting longer...")
         await page.wait_for_timeout(5000)
-    await page.wait_for_timeout(1500)
 
     await page.fill("#login-form_staffCode", username)
     await page.fill("#login-form_password", password)
@@ -333,12 +377,12 @@ async def login_and_get_context(username: str, password: str):
         if await channel_dropdown.count() == 0:
             channel_dropdown = page.locator(".ant-select-selection-item").last
         await channel_dropdown.click(force=True, timeout=5000)
-        await page.wait_for_timeout(1000)
-        await page.locator(
+        email_option = page.locator(
             ".ant-select-item-option-content:has-text('Email')"
-        ).first.click(force=True, timeout=5000)
+        ).first
+        await email_option.wait_for(state="visible", timeout=5000)
+        await email_option.click(force=True, timeout=5000)
         print("✅ Selected Email channel")
-        await page.wait_for_timeout(1000)
     except Exception as e:
         print(f"⚠️ Error selecting OTP channel: {e}")
 
@@ -369,21 +413,23 @@ async def login_and_get_context(username: str, password: str):
                 continue
         if not tc_checked:
             print("  ⚠️ Could not find T&C checkbox")
-        await page.wait_for_timeout(1000)
     except Exception as e:
         print(f"  ⚠️ Warning clicking checkboxes: {e}")
 
     # --- Request OTP ---
     print("Requesting OTP...")
     try:
-        await page.click("text=GET", timeout=5000)
+        # GET fires the OTP request as an XHR; settle on its response instead of a fixed 2s
+        async with page.expect_response(
+            lambda r: r.request.resource_type in ("xhr", "fetch"), timeout=5000
+        ):
+            await page.click("text=GET", timeout=5000)
         print("✅ Clicked GET button")
     except Exception as e:
-        print(f"⚠️ Warning clicking GET: {e}")
+        print(f"⚠️ Warning clicking GET / waiting for the OTP request: {e}")
 
     # Screenshot to confirm GET was clicked and OTP field appeared
     os.makedirs("logs", exist_ok=True)
-    await page.wait_for_timeout(2000)
     await page.screenshot(path="logs/after_get_click.png")
     print("📸 Screenshot saved to logs/after_get_click.png")
 
@@ -417,20 +463,22 @@ async def login_and_get_context(username: str, password: str):
             await page.locator('button[type="submit"]').click(force=True)
 
         print("Sign In clicked, waiting for dashboard...")
-        await page.wait_for_timeout(10000)
+        # Returns as soon as we leave the login page (previously a fixed 10s + 15s)
+        try:
+            await page.wait_for_url(
+                lambda url: "login" not in url.lower(), timeout=25000
+            )
+        except Exception:
+            pass
 
         # Check if login succeeded
         await page.screenshot(path="logs/after_sign_in.png")
         print(f"  📍 URL after sign in: {page.url}")
         if "login" in page.url.lower():
-            print("  ⚠️ Still on login page after Sign In, waiting longer...")
-            await page.wait_for_timeout(15000)
-            await page.screenshot(path="logs/after_sign_in_extra_wait.png")
-            print(f"  📍 URL after extra wait: {page.url}")
+            print("  ⚠️ Still on login page 25s after Sign In")
 
         print("Navigating to Retail History...")
         await page.goto(HISTORY_URL, wait_until="networkidle", timeout=90000)
-        await page.wait_for_timeout(3000)
 
         print(f"  📍 URL after navigation: {page.url}")
         if "login" in page.url.lower():
@@ -442,17 +490,14 @@ async def login_and_get_context(username: str, password: str):
             if await later_btn.is_visible(timeout=3000):
                 print("✅ Found 'Later' popup. Clicking it...")
                 await later_btn.click()
-                await page.wait_for_timeout(1000)
+                await later_btn.wait_for(state="hidden", timeout=3000)
         except Exception:
             pass
 
         print("Waiting for app initialization...")
         await page.wait_for_load_state("networkidle", timeout=30000)
-        await page.wait_for_timeout(2000)
 
         await save_session(context)
         return browser, context, pw, page
     else:
-        await browser.close()
-        raise RuntimeError("Failed to retrieve OTP from Telegram")
         raise RuntimeError("Failed to retrieve OTP from Telegram")
@@ -21,7 +21,7 @@ load_dotenv()
 from check_custid import check_custids_multi_month
 from check_status import check_status_multi_month, get_last_n_months
 from credential_manager import CredentialManager
-from login_manager import login_and_get_context
+from login_manager import close_browser, login_and_get_context
 
 CUSTID_STATE_FILE = os.path.join(os.path.dirname(__file__), "logs", "custid_state.json")
 
@@ -60,9 +60,7 @@ async def establish_session(username: str, password: str):
     await save_session(context)
     print("Session re-saved after verification.\n")
 
-    await context.close()
-    await browser.close()
-    await pw.stop()
+    await close_browser(browser, context, pw)
 
 
 def run_scrape_subprocess(month: str, year: int) -> subprocess.CompletedProcess:
@@ -3,38 +3,100 @@ Pure UI scraper with improved incremental sync based on Updated Date vs Last Syn
 Supports both CSV export (Telegram) and Google Sheets (daily)
 """
 
+import asyncio
 import csv
+import functools
 import json
 import os
-from datetime import datetime, time
+import re
+import time
+from datetime import datetime
+from itertools import zip_longest
 from typing import Dict, List, Optional, Tuple
 
+from gspread.utils import rowcol_to_a1
 from playwright.async_api import Page
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-from date_utils import month_range_yyyymmddhhmmss, standardize_date
+from date_utils import month_range_yyyymmddhhmmss, standardize_date, ui_datetime_parts
 from gsheets_writer import (
+    HEADERS,
     ensure_tab,
     ensure_tabs_sorted_by_month,
     month_tab_title,
     open_sheet,
+    sort_tab_by_created_date,
     upsert_rows,
 )
-from login_manager import login_and_get_context
+from login_manager import close_browser, login_and_get_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 OUTPUT_DIR = "outputs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# CSV checkpoint log is appended every N orders or T seconds, whichever comes first,
+# and compacted into a single snapshot line every CHECKPOINT_COMPACT_EVERY entries
+CHECKPOINT_EVERY = 25
+CHECKPOINT_INTERVAL = 5
+CHECKPOINT_COMPACT_EVERY = 500
+
+# Sheets rows are upserted in batches of N rows or every T seconds
+SHEETS_FLUSH_EVERY = 10
+SHEETS_FLUSH_INTERVAL = 3
+
+# Detail pages fetched in parallel per results page
+DETAIL_CONCURRENCY = 4
+# Seconds without any detail page coming back to the pool before it is treated as dead
+DETAIL_POOL_TIMEOUT = 60
+# Direct (replayed) getCeeOrderDetail requests in flight at once
+DETAIL_API_CONCURRENCY = 8
+
+# Order-level attrValueList codes read from getCeeOrderDetail
+_WANTED_ATTRS = frozenset({"EXP_ORDER_CONTACT_EMAIL", "EXP_ORDER_CONTACT_NUMBER"})
+
+# Trimmed text of every cell of each results row, read in a single evaluate per page
+_ROW_CELLS_JS = """(sel) => Array.from(document.querySelectorAll(sel), (tr) =>
+    Array.from(tr.querySelectorAll('td'), (td) => (td.textContent || '').trim()))"""
 
+# Order number carried in the getCeeOrderDetail request URL (if present)
+_ORDER_RE = re.compile(r"custOrder(?:Nbr|Id)=(\d+)")
+
+
+@functools.lru_cache(maxsize=8192)
 def format_datetime(datetime_str):
     """Convert 20251022093000 to '22 Oct 2025 09:30'"""
     if not datetime_str or len(datetime_str) != 14:
         return ""
+    # Full validation (day-of-month, hour, ...); the cache keeps repeats cheap
     try:
         dt = datetime.strptime(datetime_str, "%Y%m%d%H%M%S")
-        return dt.strftime("%d %b %Y %H:%M")
-    except:
+    except ValueError:
         return datetime_str
+    return dt.strftime("%d %b %Y %H:%M")
+
+
+_DEVICE_KEYWORDS = (
+    "ipad", "tablet", "phone", "watch", "galaxy",
+    "iphone", "samsung", "device", "premium value",
+)
+
+
+def _is_device_offer(offer: dict) -> bool:
+    """True if an offerInstList entry looks like a physical device"""
+    attrs = {a.get("attrCode"): a.get("value") for a in offer.get("attrValueList") or []}
+    catg = attrs.get("TM_ADDITIONAL_OFFER_CATG", "")
+    if catg == "SMART_DEVICE" or "EXP_DEVICE_ESN" in attrs:
+        return True
+    if "EXP_GOODS_DELIVERY_METHOD" not in attrs:
+        return False
+    if catg not in ("COMBOX", ""):
+        return True
+    offer_name_lower = (offer.get("offerName") or "").lower()
+    return any(kw in offer_name_lower for kw in _DEVICE_KEYWORDS)
 
 
 async def close_blocking_popup(page: Page):
@@ -85,11 +147,82 @@ async def close_blocking_popup(page: Page):
         print(f"  - ⚠️ Error while trying to close popup: {e}")
 
 
+async def table_rows_state(page: Page, rows_selector: str) -> List:
+    """[row count, first row's data-row-key] for a table, in one round-trip."""
+    return await page.evaluate(
+        """(sel) => {
+            const rows = document.querySelectorAll(sel);
+            return [rows.length, rows.length ? rows[0].getAttribute('data-row-key') : null];
+        }""",
+        rows_selector,
+    )
+
+
+async def wait_for_rows_change(
+    page: Page, rows_selector: str, before: List, timeout: int = 10000
+):
+    """Wait until a table re-renders (row count or first row changes) instead of sleeping."""
+    try:
+        await page.wait_for_function(
+            """([sel, count, key]) => {
+                const rows = document.querySelectorAll(sel);
+                return rows.length > 0 &&
+                    (rows.length !== count || rows[0].getAttribute('data-row-key') !== key);
+            }""",
+            arg=[rows_selector, before[0], before[1]],
+            timeout=timeout,
+        )
+    except Exception:
+        # Nothing changed (e.g. fewer rows than the page size) - carry on
+        pass
+
+
+def _loads_json(body: bytes):
+    """Decode a JSON response body - orjson when installed, else stdlib json."""
+    return orjson.loads(body) if orjson else json.loads(body)
+
+
+def load_checkpoint_log(path: str) -> Tuple[Dict[str, str], Dict]:
+    """
+    Replay a CSV checkpoint log.
+    Lines are either {"snapshot": {"completed": {...}, "incomplete": {...}}}
+    (written on compaction) or {"completed": [order_id, iso_timestamp]} deltas.
+    Returns (completed {order_id: iso_timestamp}, incomplete dict).
+    """
+    completed = {}
+    incomplete = {}
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            snapshot = entry.get("snapshot")
+            if snapshot:
+                completed.update(snapshot.get("completed", {}))
+                incomplete = dict(snapshot.get("incomplete", {}))
+            elif "completed" in entry:
+                order_id, synced = entry["completed"]
+                completed[order_id] = synced
+                incomplete.pop(order_id, None)
+    return completed, incomplete
+
+
 def parse_ui_date(date_str):
     """Parse date from UI format '29 Oct 2025 11:27:31' to datetime object"""
     if not date_str:
         return None
     try:
+        # Fast path: the UI's "D Mon YYYY H:MM[:SS]" without strptime
+        fields = ui_datetime_parts(date_str)
+        if fields:
+            try:
+                return datetime(*fields)
+            except ValueError:
+                pass
         # Handle different possible formats
         for fmt in [
             "%d %b %Y %H:%M:%S",
@@ -123,9 +256,13 @@ def _to_utc(dt: datetime) -> datetime:
         if LOCAL_TZ:
             dt = dt.replace(tzinfo=LOCAL_TZ)
         return dt if not UTC_TZ else dt.astimezone(UTC_TZ)
+    # Already UTC (e.g. a "...Z" string) - nothing to convert
+    if dt.tzinfo is UTC_TZ or not dt.utcoffset():
+        return dt
     return dt if not UTC_TZ else dt.astimezone(UTC_TZ)
 
 
+@functools.lru_cache(maxsize=8192)
 def parse_last_synced(last_synced_str: str):
     """Parse 'Last Synced' into a timezone-aware UTC datetime.
     Accepts ISO with T or space, optional Z/offsets, and common human formats.
@@ -178,7 +315,7 @@ async def click_and_select_all_agents(page) -> int:
     print("\n🎯 Selecting agents from UI...")
 
     await page.click('button:has-text("Filter")', timeout=15000)
-    await page.wait_for_timeout(5000)
+    await page.wait_for_selector("span.icon-ic_nav_expand", state="attached", timeout=15000)
 
     # Expand "Created by" section
     print("  📂 Expanding 'Created by' section...")
@@ -186,29 +323,28 @@ async def click_and_select_all_agents(page) -> int:
         await page.evaluate(
             '() => document.querySelector("span.icon-ic_nav_expand").click()'
         )
-        await page.wait_for_timeout(1500)
     except:
         await page.click("span.icon-ic_nav_expand", force=True, timeout=5000)
-        await page.wait_for_timeout(1500)
 
     # Open channel modal
     print("  🖼️ Opening channel selection modal...")
     try:
         await page.click('img[src*="chooseChannel"]', timeout=5000)
-        await page.wait_for_timeout(2000)
     except:
         await page.click('img[alt*="channel"]', timeout=3000)
-        await page.wait_for_timeout(2000)
+
+    modal_rows = ".ant-modal-body tr.ant-table-row[data-row-key]"
+    await page.wait_for_selector(modal_rows, timeout=10000)
 
     # Set 50/page in modal to minimize clicking "Next"
     try:
         # Targeting the dropdown specifically inside the modal
         modal_dropdown = page.locator(".ant-modal-body .ant-select-selection--single")
         if await modal_dropdown.count() > 0:
+            before = await table_rows_state(page, modal_rows)
             await modal_dropdown.first.click()
-            await page.wait_for_timeout(1000)
             await page.click('.ant-select-dropdown-menu-item:has-text("50 / page")')
-            await page.wait_for_timeout(2000)
+            await wait_for_rows_change(page, modal_rows, before, timeout=5000)
     except Exception as e:
         print(f"  ⚠️ Could not set modal pagination: {e}")
 
@@ -217,24 +353,29 @@ async def click_and_select_all_agents(page) -> int:
 
     while True:
         # Wait for table rows in the modal
-        await page.wait_for_selector(
-            ".ant-modal-body tr.ant-table-row[data-row-key]", timeout=10000
+        await page.wait_for_selector(modal_rows, timeout=10000)
+
+        # Click every row of this modal page in one go (clicking selects the agent in this UI)
+        clicked = await page.evaluate(
+            """(sel) => {
+                const rows = document.querySelectorAll(sel);
+                rows.forEach((tr) => tr.click());
+                return rows.length;
+            }""",
+            modal_rows,
         )
-        channel_rows = await page.locator(
-            ".ant-modal-body tr.ant-table-row[data-row-key]"
-        ).all()
+        total_selected += clicked
+        print(f"  📋 Page {page_num}: Selected {clicked} agents")
 
-        print(f"  📋 Page {page_num}: Selecting {len(channel_rows)} agents...")
-
-        for row in channel_rows:
-            try:
-                # We check if it's already selected by looking for a class or checkbox state if applicable
-                # but clicking usually toggles or selects in this UI
-                await row.click()
-                total_selected += 1
-                await page.wait_for_timeout(50)
-            except:
-                pass
+        # Give Ant Design a moment to commit the selection if it marks selected rows
+        try:
+            await page.wait_for_function(
+                """([sel, n]) => document.querySelectorAll(sel + '.ant-table-row-selected').length >= n""",
+                arg=[modal_rows, clicked],
+                timeout=2000,
+            )
+        except Exception:
+            pass
 
         # Check for Pagination inside the modal
         next_btn = page.locator(".ant-modal-body li.ant-pagination-next")
@@ -246,15 +387,19 @@ async def click_and_select_all_agents(page) -> int:
             break
 
         print(f"  ➡️ Moving to next page of agents...")
+        before = await table_rows_state(page, modal_rows)
         await next_btn.click()
-        await page.wait_for_timeout(3000)  # Wait for table to refresh
+        await wait_for_rows_change(page, modal_rows, before)
         page_num += 1
 
     # Click the final Select button to confirm
     await page.click(
         'button:has-text("Select"):not(:has-text("Select All"))', timeout=5000
     )
-    await page.wait_for_timeout(2000)
+    try:
+        await page.wait_for_selector(".ant-modal-body", state="hidden", timeout=5000)
+    except Exception:
+        pass
 
     return total_selected
 
@@ -265,7 +410,7 @@ async def check_existing_orders_with_dates(
     """
     Check Google Sheet for existing orders, their dates, and MISSING DATA.
     Returns:
-        - complete_orders: {order_id: last_synced_datetime}
+        - complete_orders: {order_id: last_synced_datetime (or raw string if unparsable)}
         - incomplete_orders: {order_id: row_index}
         - orders_missing_org: set(order_ids) -> IDs that have Last Synced but no Org Code
     """
@@ -274,7 +419,7 @@ async def check_existing_orders_with_dates(
     orders_missing_org = set()
 
     try:
-        records = ws.get_all_values()
+        records = await asyncio.to_thread(ws.get_all_values)
         if not records:
             return {}, {}, set()
 
@@ -379,23 +524,24 @@ async def scrape_orders_month(
         created_from, created_to = month_range_yyyymmddhhmmss(month_text, year)
 
         # Prepare output
+        # (Sheets calls are blocking HTTP - run them in a thread so the browser's event loop keeps going)
         if output_format == "sheets":
-            spread = open_sheet()
+            spread = await asyncio.to_thread(open_sheet)
             tab_title = month_tab_title(month_text, year)
-            ws = ensure_tab(spread, tab_title)
+            ws = await asyncio.to_thread(ensure_tab, spread, tab_title)
 
             # Ensure tabs are sorted by month (chronological)
-            ensure_tabs_sorted_by_month(spread)
+            await asyncio.to_thread(ensure_tabs_sorted_by_month, spread)
 
             print(f"📊 Google Sheets tab: {tab_title}")
-            ws = spread.worksheet(tab_title)
-            all_orders = []
+            ws = await asyncio.to_thread(spread.worksheet, tab_title)
         else:
-            all_orders = []
+            # Rows go straight to disk; only a count is kept in memory
+            csv_row_count = 0
             if not csv_filename:
                 csv_filename = f"unifi_orders_{month_text}_{year}_{datetime.now(LOCAL_TZ).strftime('%Y%m%d_%H%M%S')}.csv"
             csv_path = os.path.join(OUTPUT_DIR, csv_filename)
-            checkpoint_file = csv_path.replace(".csv", "_checkpoint.json")
+            checkpoint_file = csv_path.replace(".csv", "_checkpoint.jsonl")
             print(f"📄 CSV file: {csv_path}")
             ws = None
 
@@ -411,7 +557,13 @@ async def scrape_orders_month(
                 await page.locator('text="History"').last.click(timeout=15000)
                 history_clicked = True
                 print(f"  ✅ History tab clicked (attempt {attempt + 1})")
-                await page.wait_for_timeout(10000)
+                # The month picker is the first thing we need from the History tab
+                try:
+                    await page.wait_for_selector(
+                        ".ant-picker .ant-picker-input", state="visible", timeout=15000
+                    )
+                except Exception:
+                    pass
                 break
             except Exception as e:
                 print(f"  ⚠️ Attempt {attempt + 1} failed: {e}")
@@ -429,7 +581,9 @@ async def scrape_orders_month(
 
             # Click to open date picker
             await page.click(".ant-picker .ant-picker-input", timeout=15000)
-            await page.wait_for_timeout(5000)
+            await page.wait_for_selector(
+                "td.ant-picker-cell", state="visible", timeout=10000
+            )
 
             # Navigate to correct year
             current_year = datetime.now(LOCAL_TZ).year
@@ -458,7 +612,6 @@ async def scrape_orders_month(
             await page.click(
                 f'td.ant-picker-cell:has-text("{month_text}")', timeout=20000
             )
-            await page.wait_for_timeout(1000)
             print(f"  ✅ Set to {month_text} {year}")
 
         except Exception as e:
@@ -469,6 +622,8 @@ async def scrape_orders_month(
 
         # Click Query
         print("\n🔍 Clicking Query...")
+        results_rows = "tbody tr.ant-table-row"
+        before_query = await table_rows_state(page, results_rows)
         try:
             await page.evaluate(
                 """() => {
@@ -480,7 +635,8 @@ async def scrape_orders_month(
         except:
             await page.click('button:has-text("Query")', force=True)
 
-        await page.wait_for_timeout(3000)
+        # Wait for the queried rows to replace whatever the table showed before
+        await wait_for_rows_change(page, results_rows, before_query, timeout=15000)
 
         # Set pagination to 50/page
         print("📄 Setting results to 50/page...")
@@ -489,10 +645,9 @@ async def scrape_orders_month(
             await page.wait_for_selector(
                 "table tbody tr", timeout=45000, state="visible"
             )
-            await page.wait_for_timeout(2000)
 
             # Count current rows BEFORE changing pagination
-            initial_row_count = await page.locator("tbody tr.ant-table-row").count()
+            initial_row_count = await page.locator(results_rows).count()
             print(f"  📊 Initial rows visible: {initial_row_count}")
 
             all_pag = page.locator('.ant-select-selection--single[role="combobox"]')
@@ -504,22 +659,24 @@ async def scrape_orders_month(
 
                 if "10" in current_text:
                     print(f"  Current: {current_text}, changing to 50/page...")
+                    before = await table_rows_state(page, results_rows)
+
                     await last_pag.click()
-                    await page.wait_for_timeout(2000)
-                    await page.click(
+                    option_50 = page.locator(
                         '.ant-select-dropdown-menu-item:has-text("50 / page")'
-                    )
+                    ).first
+                    await option_50.wait_for(state="visible", timeout=10000)
+                    await option_50.click()
 
-                    # Wait for page to reload
+                    # Wait for the table to re-render with the bigger page
                     print("⏳ Waiting for page to reload...")
-                    await page.wait_for_timeout(45000)
-
-                    # Count rows after change
-                    new_row_count = await page.locator("tbody tr.ant-table-row").count()
-                    print(f"  ✅ Rows after change: {new_row_count}")
+                    # Under 10 rows everything already fits on one page - nothing will change
+                    if initial_row_count >= 10:
+                        await wait_for_rows_change(
+                            page, results_rows, before, timeout=45000
+                        )
 
-                    # FIX: Don't wait for 50 rows if we have fewer
-                    final_count = await page.locator("tbody tr.ant-table-row").count()
+                    final_count = await page.locator(results_rows).count()
                     print(f"  ✅ Loaded {final_count} rows")
 
         except Exception as e:
@@ -548,16 +705,11 @@ async def scrape_orders_month(
 
             if os.path.exists(checkpoint_file):
                 try:
-                    with open(checkpoint_file, "r") as f:
-                        checkpoint = json.load(f)
-                        # Convert to datetime objects for CSV mode too
-                        for order_id, last_synced_str in checkpoint.get(
-                            "completed", {}
-                        ).items():
-                            last_synced_dt = parse_last_synced(last_synced_str)
-                            if last_synced_dt:
-                                complete_orders[order_id] = last_synced_dt
-                        incomplete_orders = checkpoint.get("incomplete", {})
+                    completed_log, incomplete_orders = load_checkpoint_log(
+                        checkpoint_file
+                    )
+                    # Kept as ISO strings; only membership is checked while scraping
+                    complete_orders.update(completed_log)
 
                     print(f"\n🔍 Checkpoint found:")
                     if complete_orders:
@@ -570,103 +722,190 @@ async def scrape_orders_month(
             # Load partial CSV
             if os.path.exists(csv_path):
                 try:
-                    import csv as csv_lib
-
                     with open(csv_path, "r", encoding="utf-8") as f:
-                        reader = csv_lib.DictReader(f)
-                        all_orders = list(reader)
-                    print(f"  📄 Loaded {len(all_orders)} orders from CSV")
+                        csv_row_count = sum(1 for _ in csv.DictReader(f))
+                    print(f"  📄 Found {csv_row_count} orders already in CSV")
                 except:
-                    all_orders = []
+                    csv_row_count = 0
+
+        # CSV output stays open for the whole run (writer is built on the first row)
+        csv_file = None
+        csv_writer = None
+        if output_format == "csv":
+            csv_file = open(csv_path, "a", newline="", encoding="utf-8")
 
-        # Setup API interception
-        captured_details = {}
         processed_orders = set()  # Track orders we've already processed/failed
 
         # Prevent duplicate logs/processing within a run
         seen_ids = set()
 
-        async def intercept_response(response):
-            """Capture order detail API responses"""
+        # Reusable detail pages — opened on demand (up to DETAIL_CONCURRENCY), reused for all orders
+        detail_pages: List[Page] = []
+        # Holds idle pages, or None for a slot whose page couldn't be (re)opened
+        detail_pool: asyncio.Queue = asyncio.Queue()
+        detail_slots = {"opened": 0, "returned": 0}
+        # order_id -> future resolved by the detail pages' response listener
+        pending_details: Dict[str, asyncio.Future] = {}
+        # getCeeOrderDetail request seen on a detail page, replayed directly for later orders
+        detail_api = {"template": None, "disabled": False}
+        detail_api_sem = asyncio.Semaphore(DETAIL_API_CONCURRENCY)
+
+        def _remember_detail_request(req, order_id: str):
+            """Keep the first detail API request as a template (if it carries the order id)"""
+            post_data = req.post_data or ""
+            if order_id not in req.url and order_id not in post_data:
+                return
+            headers = {
+                k: v
+                for k, v in req.headers.items()
+                if not k.startswith(":")
+                and k.lower() not in ("host", "cookie", "content-length")
+            }
+            detail_api["template"] = {
+                "order_id": order_id,
+                "url": req.url,
+                "method": req.method,
+                "post_data": post_data,
+                "headers": headers,
+            }
+            print("  ⚡ Captured getCeeOrderDetail request - fetching further orders directly")
+
+        async def _replay_detail_request(order_id: str) -> dict:
+            """Call getCeeOrderDetail directly with the session cookies; {} if unavailable"""
+            tpl = detail_api["template"]
+            if not tpl:
+                return {}
+            url = tpl["url"].replace(tpl["order_id"], order_id)
+            post_data = tpl["post_data"].replace(tpl["order_id"], order_id) or None
             try:
-                url = response.url
-                if "getCeeOrderDetail" in url and response.status == 200:
+                async with detail_api_sem:
+                    resp = await page.context.request.fetch(
+                        url,
+                        method=tpl["method"],
+                        headers=tpl["headers"],
+                        data=post_data,
+                        timeout=15000,
+                    )
                     try:
-                        json_data = await response.json()
-                        data = json_data.get("data", {})
-                        order_number = data.get("custOrderNbr", "")
-                        if order_number:
-                            captured_details[order_number] = json_data
-                            print(f"\n    📡 API response captured for {order_number}")
-                    except:
-                        pass
-            except:
-                pass
-
-        page.on("response", intercept_response)
-
-        # Reusable detail page — created once, reused for all orders
-        detail_page = None
+                        if not resp.ok:
+                            raise RuntimeError(f"HTTP {resp.status}")
+                        jd = _loads_json(await resp.body())
+                    finally:
+                        # Free the body held by the Playwright driver
+                        await resp.dispose()
+            except Exception as e:
+                # Don't keep hammering a replay that doesn't work; go back to page loads
+                if detail_api["template"]:
+                    print(f"  ⚠️ Direct detail request failed ({e}) - using page loads")
+                detail_api["template"] = None
+                detail_api["disabled"] = True
+                return {}
+            if not isinstance(jd, dict):
+                return {}
+            data = jd.get("data") or {}
+            cust_nbr = str(data.get("custOrderNbr") or data.get("orderId") or "").strip()
+            return jd if cust_nbr == order_id else {}
+
+        async def _on_detail_response(resp):
+            """Detail pages' response listener; resolves the matching pending order"""
+            if "getCeeOrderDetail" not in resp.url or resp.status != 200:
+                return
+            # Skip the body parse when the URL already names an order nobody is waiting for
+            m = _ORDER_RE.search(resp.url)
+            if m and m.group(1) not in pending_details:
+                return
+            try:
+                jd = _loads_json(await resp.body())
+            except Exception:
+                return
+            if not isinstance(jd, dict):
+                return
+            data = jd.get("data") or {}
+            cust_nbr = str(data.get("custOrderNbr") or data.get("orderId") or "").strip()
+            fut = pending_details.get(cust_nbr)
+            if fut is not None and not fut.done():
+                fut.set_result(jd)
+                if not detail_api["template"] and not detail_api["disabled"]:
+                    _remember_detail_request(resp.request, cust_nbr)
+
+        async def _new_detail_page() -> Page:
+            dp = await page.context.new_page()
+            dp.on("response", _on_detail_response)
+            return dp
+
+        def _release_detail_page(dp: Optional[Page]):
+            detail_pool.put_nowait(dp)
+            detail_slots["returned"] += 1
+
+        async def _acquire_detail_page() -> Page:
+            """Take an idle detail page from the pool, opening one while under the limit"""
+            if detail_pool.empty() and detail_slots["opened"] < DETAIL_CONCURRENCY:
+                detail_slots["opened"] += 1  # reserve the slot before awaiting
+                dp = None
+            else:
+                while True:
+                    returned = detail_slots["returned"]
+                    try:
+                        dp = await asyncio.wait_for(detail_pool.get(), DETAIL_POOL_TIMEOUT)
+                        break
+                    except asyncio.TimeoutError:
+                        if detail_slots["returned"] == returned:
+                            raise RuntimeError("no detail page freed up - detail pool is stuck")
+                if dp is not None and not dp.is_closed():
+                    return dp
+            try:
+                dp = await _new_detail_page()
+            except Exception:
+                # Hand the slot on so the next waiter retries instead of blocking forever
+                _release_detail_page(None)
+                raise
+            detail_pages.append(dp)
+            return dp
 
         async def fetch_order_json_via_api(order_id: str) -> dict:
-            """Fetch order detail by reusing a single page (avoids creating/destroying pages)."""
-            nonlocal detail_page
-            captured = {}
-
-            async def _intercept(resp):
-                try:
-                    if "getCeeOrderDetail" in resp.url and resp.status == 200:
-                        jd = await resp.json()
-                        if isinstance(jd, dict):
-                            data = jd.get("data", {})
-                            cust_nbr = (
-                                data.get("custOrderNbr")
-                                or data.get("orderId")
-                                or ""
-                            )
-                            if str(cust_nbr).strip() == str(order_id).strip():
-                                captured["json"] = jd
-                except Exception:
-                    pass
-
-            # Create the detail page once, reuse it for subsequent orders
-            if detail_page is None or detail_page.is_closed():
-                detail_page = await page.context.new_page()
-
-            detail_page.on("response", _intercept)
-
-            for attempt in range(1, 3):
-                try:
-                    url = f"https://dealer.unifi.com.my/esales/h5/onBoarding/OrderDetails?custOrderId={order_id}&custOrderNbr={order_id}"
-                    await detail_page.goto(url, wait_until="networkidle", timeout=90000)
+            """Fetch order detail directly via the captured API request, else on a pooled page."""
+            order_id = str(order_id).strip()
 
-                    for _ in range(20):
-                        if "json" in captured:
-                            break
-                        await detail_page.wait_for_timeout(600)
+            api_json = await _replay_detail_request(order_id)
+            if api_json:
+                return api_json
 
-                    await detail_page.wait_for_timeout(500)
+            detail_page = None
+            fut = asyncio.get_running_loop().create_future()
+            pending_details[order_id] = fut
 
-                    if "json" in captured:
+            try:
+                detail_page = await _acquire_detail_page()
+                for attempt in range(1, 3):
+                    try:
+                        url = f"https://dealer.unifi.com.my/esales/h5/onBoarding/OrderDetails?custOrderId={order_id}&custOrderNbr={order_id}"
+                        # Only the getCeeOrderDetail response matters; don't wait for networkidle
+                        await detail_page.goto(url, wait_until="commit", timeout=10000)
+                        await asyncio.wait_for(asyncio.shield(fut), 8)
                         break
 
-                    if attempt < 2:
-                        print(f"  ⚠️ Attempt {attempt} failed for {order_id}, retrying...")
-                        await detail_page.wait_for_timeout(3000)
-
-                except Exception as e:
-                    if attempt < 2:
-                        print(f"  ⚠️ Attempt {attempt} error for {order_id}: {e}, retrying...")
-                        await detail_page.wait_for_timeout(3000)
-                    else:
-                        print(f"  ❌ All attempts failed for {order_id}: {e}")
-
-            detail_page.remove_listener("response", _intercept)
-
-            if "json" not in captured:
+                    except asyncio.TimeoutError:
+                        if attempt < 2:
+                            print(f"  ⚠️ Attempt {attempt} failed for {order_id}, retrying...")
+                            await detail_page.wait_for_timeout(3000)
+
+                    except Exception as e:
+                        if attempt < 2:
+                            print(f"  ⚠️ Attempt {attempt} error for {order_id}: {e}, retrying...")
+                            await detail_page.wait_for_timeout(3000)
+                        else:
+                            print(f"  ❌ All attempts failed for {order_id}: {e}")
+            finally:
+                pending_details.pop(order_id, None)
+                if detail_page is not None:
+                    _release_detail_page(detail_page)
+
+            if not fut.done():
+                fut.cancel()
                 print(f"⚠️ No getCeeOrderDetail JSON captured for {order_id}")
+                return {}
 
-            return captured.get("json", {}) or {}
+            return fut.result() or {}
 
         # Start scraping with crash-safe error handling
         sync_header = (
@@ -682,7 +921,98 @@ async def scrape_orders_month(
         skipped_count = 0
         updated_count = 0
         page_number = 1
-        found_old_order = False  # Flag to detect when we hit old orders
+        created_from_dt = datetime.strptime(created_from, "%Y%m%d%H%M%S")
+
+        checkpoint_log: List[str] = []  # delta lines not yet written
+        checkpoint_logged = 0  # delta lines written since the last compaction
+        last_checkpoint_flush = time.monotonic()
+
+        def flush_checkpoint(force: bool = False):
+            """Append pending checkpoint deltas (or compact the log) once a batch is due"""
+            nonlocal checkpoint_logged, last_checkpoint_flush
+            if output_format != "csv" or not checkpoint_log:
+                return
+            now = time.monotonic()
+            if (
+                not force
+                and len(checkpoint_log) < CHECKPOINT_EVERY
+                and now - last_checkpoint_flush < CHECKPOINT_INTERVAL
+            ):
+                return
+
+            if checkpoint_logged + len(checkpoint_log) >= CHECKPOINT_COMPACT_EVERY:
+                snapshot = {
+                    "snapshot": {
+                        "completed": complete_orders,
+                        "incomplete": incomplete_orders,
+                    },
+                    "last_update": datetime.now(LOCAL_TZ).isoformat(),
+                }
+                tmp_file = checkpoint_file + ".tmp"
+                with open(tmp_file, "w") as f:
+                    f.write(json.dumps(snapshot) + "\n")
+                os.replace(tmp_file, checkpoint_file)
+                checkpoint_logged = 0
+            else:
+                with open(checkpoint_file, "a") as f:
+                    f.writelines(checkpoint_log)
+                checkpoint_logged += len(checkpoint_log)
+
+            checkpoint_log.clear()
+            last_checkpoint_flush = now
+
+        # Sheet rows are handed to a background writer so the page loop never waits on Sheets.
+        # pending_rows is the batch being written (rows stay there if every retry fails).
+        pending_rows: List[Dict] = []
+        sheet_queue: asyncio.Queue = asyncio.Queue()
+        sheet_writer_task: Optional[asyncio.Task] = None
+
+        async def write_pending_rows():
+            """Upsert the current batch in a worker thread, with backoff between retries"""
+            for attempt in range(3):
+                try:
+                    await asyncio.to_thread(upsert_rows, ws, list(pending_rows))
+                    print(f"  💾 Saved {len(pending_rows)} order(s) to Google Sheets")
+                    pending_rows.clear()
+                    return
+                except Exception as e:
+                    print(f"  ⚠️ Sheets write failed (attempt {attempt + 1}/3): {e}")
+                    await asyncio.sleep(2**attempt)
+
+        async def sheet_writer():
+            """Collect queued rows into batches (N rows or T seconds) and write them"""
+            closing = False
+            while not closing:
+                row = await sheet_queue.get()
+                if row is None:
+                    break
+                pending_rows.append(row)
+                deadline = time.monotonic() + SHEETS_FLUSH_INTERVAL
+                while len(pending_rows) < SHEETS_FLUSH_EVERY:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(sheet_queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if row is None:
+                        closing = True
+                        break
+                    pending_rows.append(row)
+                await write_pending_rows()
+            if pending_rows:
+                await write_pending_rows()
+
+        async def stop_sheet_writer():
+            """Let the writer drain the queue and finish (safe to call more than once)"""
+            if sheet_writer_task is None or sheet_writer_task.done():
+                return
+            sheet_queue.put_nowait(None)
+            await sheet_writer_task
+
+        if output_format == "sheets":
+            sheet_writer_task = asyncio.create_task(sheet_writer())
 
         try:
             while True:
@@ -691,12 +1021,10 @@ async def scrape_orders_month(
 
                     # Wait for table to load
                     await page.wait_for_selector("table tbody tr", timeout=35000)
-                    await page.wait_for_timeout(1000)
 
                     # FIX: Ensure we're reading fresh DOM - force a small scroll to trigger re-render
                     await page.evaluate("window.scrollBy(0, 1)")
                     await page.evaluate("window.scrollBy(0, -1)")
-                    await page.wait_for_timeout(500)
 
                     # Now get the order rows for THIS page only
                     # Use only the visible tbody inside .ant-table-content (prevents reading hidden clones)
@@ -704,26 +1032,13 @@ async def scrape_orders_month(
                         "div.ant-table-content tbody.ant-table-tbody > tr.ant-table-row",
                         timeout=15000,
                     )
-                    order_rows = await page.locator(
-                        "div.ant-table-content tbody.ant-table-tbody > tr.ant-table-row"
-                    ).all()
+                    order_rows = await page.evaluate(
+                        _ROW_CELLS_JS,
+                        "div.ant-table-content tbody.ant-table-tbody > tr.ant-table-row",
+                    )
 
                     print(f"  Processing {len(order_rows)} rows...")
 
-                    # Capture first visible row's ID to confirm pagination changes later
-                    if order_rows:
-                        _first_cell_text = (
-                            await order_rows[0].locator("td").nth(0).text_content()
-                            or ""
-                        ).strip()
-                        prev_first_id = (
-                            _first_cell_text.split()[0]
-                            if "Batch" in _first_cell_text
-                            else _first_cell_text
-                        )
-                    else:
-                        prev_first_id = ""
-
                     # ALSO capture the active page number before clicking Next
                     try:
                         prev_page_num = (
@@ -737,18 +1052,23 @@ async def scrape_orders_month(
                     except Exception:
                         prev_page_num = ""
 
-                    for row_idx, row in enumerate(order_rows, 1):
+                    # Newest Updated Date seen on this page (UI sorts by updated desc)
+                    page_max_updated = None
+
+                    # Pass 1: read the visible rows and decide which orders need scraping
+                    to_scrape: List[Dict] = []
+
+                    for row_idx, cells in enumerate(order_rows, 1):
                         try:
-                            cells = await row.locator("td").all()
                             if len(cells) < 1:
                                 continue
 
                             # Get order ID
-                            order_id_text = await cells[0].text_content()
+                            order_id_text = cells[0]
                             if "Batch" in order_id_text:
-                                order_id = order_id_text.strip().split()[0]
+                                order_id = order_id_text.split()[0]
                             else:
-                                order_id = order_id_text.strip()
+                                order_id = order_id_text
 
                             if not (
                                 order_id
@@ -757,41 +1077,24 @@ async def scrape_orders_month(
                             ):
                                 continue
 
-                            # Get UI metadata
-                            event_type = (
-                                (await cells[1].text_content()).strip()
-                                if len(cells) > 1
-                                else ""
-                            )
-                            order_status = (
-                                (await cells[3].text_content()).strip()
-                                if len(cells) > 3
-                                else ""
-                            )
-                            raw_created = (
-                                (await cells[4].text_content()).strip()
-                                if len(cells) > 4
-                                else ""
-                            )
+                            # Get UI metadata (missing trailing columns read as "")
+                            cells = cells + [""] * (11 - len(cells))
+                            event_type = cells[1]
+                            order_status = cells[3]
+                            raw_created = cells[4]
                             created_date = standardize_date(raw_created)
 
-                            raw_updated = (
-                                (await cells[5].text_content()).strip()
-                                if len(cells) > 5
-                                else ""
-                            )
+                            raw_updated = cells[5]
                             updated_date = standardize_date(raw_updated)
+                            updated_dt = parse_ui_date(raw_updated)
+                            if updated_dt and (
+                                page_max_updated is None
+                                or updated_dt > page_max_updated
+                            ):
+                                page_max_updated = updated_dt
 
-                            org_code = (
-                                (await cells[9].text_content()).strip()
-                                if len(cells) > 9
-                                else ""
-                            )
-                            org_name = (
-                                (await cells[10].text_content()).strip()
-                                if len(cells) > 10
-                                else ""
-                            )
+                            org_code = cells[9]
+                            org_name = cells[10]
 
                             # Check if order should be skipped (applies to BOTH modes now)
                             should_skip = False
@@ -815,8 +1118,7 @@ async def scrape_orders_month(
                                     continue
                                 seen_ids.add(order_id)
                                 print(
-                                    f"  [{row_idx}/{len(order_rows)}] {order_id} ✨ (new)\n",
-                                    end=" ",
+                                    f"  [{row_idx}/{len(order_rows)}] {order_id} ✨ (new)"
                                 )
 
                             if should_skip:
@@ -824,74 +1126,51 @@ async def scrape_orders_month(
 
                             total_scraped += 1
 
-                            # === Frozen-ID loop + JSON fetch (proven) ===
-                            # Snapshot visible IDs and their status/dates once per page;
-                            # Use JSON for all other fields. No DOM scraping for Name/Email/etc.
-                            if row_idx == 1:
-                                try:
-                                    overrides = {}
-                                    visible_rows = await page.locator(
-                                        "div.ant-table-content tbody.ant-table-tbody tr.ant-table-row"
-                                    ).all()
-                                    for vr in visible_rows:
-                                        try:
-                                            tds = await vr.locator("td").all()
-                                            if len(tds) < 6:
-                                                continue
-                                            _id_text = (
-                                                await tds[0].text_content()
-                                            ) or ""
-                                            _id = (
-                                                _id_text.strip().split()[0]
-                                                if "Batch" in _id_text
-                                                else _id_text.strip()
-                                            )
-                                            if not _id:
-                                                continue
-                                            _event_type = (
-                                                (
-                                                    (await tds[1].text_content()) or ""
-                                                ).strip()
-                                                if len(tds) > 1
-                                                else ""
-                                            )
-                                            _status = (
-                                                (
-                                                    (await tds[3].text_content()) or ""
-                                                ).strip()
-                                                if len(tds) > 3
-                                                else ""
-                                            )
-                                            _created = (
-                                                (
-                                                    (await tds[4].text_content()) or ""
-                                                ).strip()
-                                                if len(tds) > 4
-                                                else ""
-                                            )
-                                            _updated = (
-                                                (
-                                                    (await tds[5].text_content()) or ""
-                                                ).strip()
-                                                if len(tds) > 5
-                                                else ""
-                                            )
-                                            overrides[_id] = {
-                                                "Event Type": _event_type,
-                                                "Order Status": _status,
-                                                "Created Date": _created,
-                                                "Updated Date": _updated,
-                                            }
-                                        except Exception:
-                                            continue
-                                except Exception:
-                                    overrides = {}
-
-                            api_json = await fetch_order_json_via_api(order_id)
+                            to_scrape.append(
+                                {
+                                    "order_id": order_id,
+                                    "event_type": event_type,
+                                    "order_status": order_status,
+                                    "created_date": created_date,
+                                    "updated_date": updated_date,
+                                    "org_code": org_code,
+                                    "org_name": org_name,
+                                }
+                            )
+
+                        except Exception as e:
+                            print(f"❌ {str(e)[:40]}")
+                            error_count += 1
+
+                    # Pass 2: fetch detail JSON for those orders concurrently
+                    # (bounded by the detail page pool)
+                    details = await asyncio.gather(
+                        *(fetch_order_json_via_api(m["order_id"]) for m in to_scrape),
+                        return_exceptions=True,
+                    )
+
+                    # Pass 3: build and save rows
+                    # One "synced at" stamp per page (taken after the details were fetched)
+                    synced_at = datetime.now(LOCAL_TZ)
+                    synced_iso = synced_at.isoformat()
+                    synced_cell = "'" + synced_at.strftime("%Y-%m-%d %H:%M:%S")
+
+                    for meta, api_json in zip(to_scrape, details):
+                        order_id = meta["order_id"]
+                        try:
+                            if isinstance(api_json, BaseException):
+                                print(f"  ❌ Detail fetch failed for {order_id}: {api_json}")
+                                api_json = {}
+                            event_type = meta["event_type"]
+                            order_status = meta["order_status"]
+                            created_date = meta["created_date"]
+                            updated_date = meta["updated_date"]
+                            org_code = meta["org_code"]
+                            org_name = meta["org_name"]
+
+                            data = api_json.get("data")
                             # HARD GUARD: if no usable data, do NOT overwrite detail fields with blanks
-                            if not isinstance(api_json, dict) or not api_json.get(
-                                "data"
-                            ):
+                            if not data:
                                 print(
                                     f"⚠️ No API data for {order_id} – skipping detail fields"
                                 )
@@ -902,11 +1181,6 @@ async def scrape_orders_month(
                                     pass
                                 continue
 
-                            data = (
-                                api_json.get("data", {})
-                                if isinstance(api_json, dict)
-                                else {}
-                            )
                             installation_list = (
                                 data.get("installationInfoList", []) or []
                             )
@@ -922,12 +1196,13 @@ async def scrape_orders_month(
                             cust_info = data.get("custInfo", {}) or {}
 
                             attr_values = data.get("attrValueList", []) or []
-
-                            def get_attr(code: str) -> str:
-                                for item in attr_values:
-                                    if item.get("attrCode") == code:
-                                        return item.get("value") or ""
-                                return ""
+                            # attrCode -> value for the codes we read; first non-empty wins
+                            attr_map = {
+                                code: value
+                                for item in reversed(attr_values)
+                                if (code := item.get("attrCode")) in _WANTED_ATTRS
+                                and (value := item.get("value"))
+                            }
 
                             # --- MOVED UP: Package Logic (Needed for Company Name check) ---
                             order_items = data.get("orderItemList", []) or []
@@ -948,15 +1223,17 @@ async def scrape_orders_month(
 
                             # 2. Fallback to the first main offer name if no Bundle is found
                             if not package:
-                                for item in order_items:
-                                    offer_name = (
-                                        item.get("mainOfferName")
-                                        or item.get("offerName")
-                                        or ""
-                                    )
-                                    if offer_name:
-                                        package = offer_name
-                                        break
+                                package = next(
+                                    (
+                                        offer_name
+                                        for item in order_items
+                                        if (
+                                            offer_name := item.get("mainOfferName")
+                                            or item.get("offerName")
+                                        )
+                                    ),
+                                    "",
+                                )
 
                             # --- Company Name Logic ---
                             company_name = ""
@@ -974,28 +1251,16 @@ async def scrape_orders_month(
                             # --- Device Name Logic ---
                             device_name = ""
                             if "device" in package.lower():
-                                for item in order_items:
-                                    for offer in item.get("offerInstList", []):
-                                        attrs = {a.get("attrCode"): a.get("value") for a in offer.get("attrValueList", [])}
-                                        catg = attrs.get("TM_ADDITIONAL_OFFER_CATG", "")
-                                        offer_name_lower = (offer.get("offerName") or "").lower()
-                                        is_device = (
-                                            catg == "SMART_DEVICE"
-                                            or "EXP_DEVICE_ESN" in attrs
-                                            or (
-                                                "EXP_GOODS_DELIVERY_METHOD" in attrs
-                                                and catg not in ("COMBOX", "")
-                                            )
-                                            or (
-                                                "EXP_GOODS_DELIVERY_METHOD" in attrs
-                                                and any(kw in offer_name_lower for kw in ["ipad", "tablet", "phone", "watch", "galaxy", "iphone", "samsung", "device", "premium value"])
-                                            )
-                                        )
-                                        if is_device and offer.get("offerName"):
-                                            device_name = offer.get("offerName", "")
-                                            break
-                                    if device_name:
-                                        break
+                                device_name = next(
+                                    (
+                                        offer["offerName"]
+                                        for item in order_items
+                                        for offer in item.get("offerInstList") or []
+                                        if offer.get("offerName")
+                                        and _is_device_offer(offer)
+                                    ),
+                                    "",
+                                )
 
                             # Name: prefer installation contact name, fall back to customer name
                             name = (
@@ -1007,24 +1272,28 @@ async def scrape_orders_month(
                             # Email: prefer installation contact email, fall back to attrValueList
                             email = (
                                 contact_dto.get("email")
-                                or get_attr("EXP_ORDER_CONTACT_EMAIL")
+                                or attr_map.get("EXP_ORDER_CONTACT_EMAIL", "")
                                 or ""
                             )
 
                             # Phone: combine contactDto phones + EXP_ORDER_CONTACT_NUMBER
                             phones: list[str] = []
+                            seen_phones = set()
 
-                            for k in ("contactNbr", "mobilePhone", "homePhone"):
-                                v = contact_dto.get(k)
-                                if v:
-                                    phones.append(str(v))
-
-                            order_contact_phone = get_attr("EXP_ORDER_CONTACT_NUMBER")
-                            if (
-                                order_contact_phone
-                                and order_contact_phone not in phones
+                            order_contact_phone = attr_map.get(
+                                "EXP_ORDER_CONTACT_NUMBER", ""
+                            )
+                            for v in (
+                                contact_dto.get("contactNbr"),
+                                contact_dto.get("mobilePhone"),
+                                contact_dto.get("homePhone"),
+                                order_contact_phone,
                             ):
-                                phones.append(order_contact_phone)
+                                if v:
+                                    v = str(v)
+                                    if v not in seen_phones:
+                                        seen_phones.add(v)
+                                        phones.append(v)
 
                             phone_number = ", ".join(phones)
 
@@ -1040,43 +1309,36 @@ async def scrape_orders_month(
                                 )
 
                             # Appointment
-                            appt_start = appointment_info.get(
-                                "appointmentStartTime", ""
+                            appt_start = format_datetime(
+                                appointment_info.get("appointmentStartTime", "")
+                            )
+                            appt_end = format_datetime(
+                                appointment_info.get("appointmentEndTime", "")
+                            )
+                            appointment_date = (
+                                " - ".join((appt_start, appt_end))
+                                if appt_start and appt_end
+                                else appt_start
                             )
-                            appt_end = appointment_info.get("appointmentEndTime", "")
-                            if appt_start and appt_end:
-                                appointment_date = f"{format_datetime(appt_start)} - {format_datetime(appt_end)}"
-                            elif appt_start:
-                                appointment_date = format_datetime(appt_start)
-                            else:
-                                appointment_date = ""
 
                             # Prefer values from custInfo, fall back to partyCertList if needed
+                            # (one pass picks up both the first certNbr and first certTypeName)
+                            fallback_cert, fallback_type = "", ""
+                            for c in cust_info.get("partyCertList") or ():
+                                fallback_cert = fallback_cert or c.get("certNbr") or ""
+                                fallback_type = (
+                                    fallback_type or c.get("certTypeName") or ""
+                                )
+                                if fallback_cert and fallback_type:
+                                    break
+
                             cert_number = (
                                 cust_info.get("icNbr")
                                 or cust_info.get("certNbr")
-                                or next(
-                                    (
-                                        c.get("certNbr")
-                                        for c in cust_info.get("partyCertList", [])
-                                        if c.get("certNbr")
-                                    ),
-                                    "",
-                                )
-                                or ""
+                                or fallback_cert
                             )
-
                             cert_type_name = (
-                                cust_info.get("certTypeName")
-                                or next(
-                                    (
-                                        c.get("certTypeName")
-                                        for c in cust_info.get("partyCertList", [])
-                                        if c.get("certTypeName")
-                                    ),
-                                    "",
-                                )
-                                or ""
+                                cust_info.get("certTypeName") or fallback_type
                             )
 
                             if cert_number and cert_type_name:
@@ -1109,97 +1371,65 @@ async def scrape_orders_month(
                                 "Device": device_name,
                                 "IC Number": ic_number,
                                 "Creator": creator,
-                                "Last Synced": "'"
-                                + datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S"),
+                                "Last Synced": synced_cell,
                                 "Cust ID": str(cust_info.get("custId", "")),
                             }
 
                             if output_format == "sheets":
                                 row_data["Order Number"] = f"'{order_id}"
 
-                                # CRASH-SAFE: Save immediately after each successful scrape
-                                upsert_rows(ws, [row_data])
+                                # Queued; the background writer flushes every few orders / seconds
+                                sheet_queue.put_nowait(row_data)
 
                                 # Update our tracking
-                                complete_orders[order_id] = datetime.now(LOCAL_TZ)
-                                if order_id in incomplete_orders:
-                                    del incomplete_orders[order_id]
+                                complete_orders[order_id] = synced_iso
+                                incomplete_orders.pop(order_id, None)
 
-                                print("✅ (saved immediately)")
+                                print(f"  {order_id} ✅ (queued)")
 
                             else:
                                 # CSV: append immediately
-                                all_orders.append(row_data)
-
-                                import csv as csv_lib
+                                csv_row_count += 1
 
-                                file_exists = os.path.exists(csv_path)
-                                with open(
-                                    csv_path, "a", newline="", encoding="utf-8"
-                                ) as f:
-                                    writer = csv_lib.DictWriter(
-                                        f, fieldnames=list(row_data.keys())
+                                if csv_writer is None:
+                                    csv_writer = csv.DictWriter(
+                                        csv_file, fieldnames=list(row_data.keys())
                                     )
-                                    if not file_exists:
-                                        writer.writeheader()
-                                    writer.writerow(row_data)
-
-                                # Update checkpoint with datetime
-                                complete_orders[order_id] = datetime.now(LOCAL_TZ)
-                                if order_id in incomplete_orders:
-                                    del incomplete_orders[order_id]
-
-                                checkpoint_data = {
-                                    "completed": {
-                                        k: v.isoformat()
-                                        for k, v in complete_orders.items()
-                                    },
-                                    "incomplete": incomplete_orders,
-                                    "last_update": datetime.now(LOCAL_TZ).isoformat(),
-                                }
-                                with open(checkpoint_file, "w") as f:
-                                    json.dump(checkpoint_data, f)
+                                    if csv_file.tell() == 0:
+                                        csv_writer.writeheader()
+                                csv_writer.writerow(row_data)
+                                csv_file.flush()
+
+                                # Update checkpoint (ISO string, persisted as-is)
+                                complete_orders[order_id] = synced_iso
+                                incomplete_orders.pop(order_id, None)
+
+                                checkpoint_log.append(
+                                    json.dumps({"completed": [order_id, synced_iso]})
+                                    + "\n"
+                                )
+                                flush_checkpoint()
 
-                                print("✅ (saved immediately)")
+                                print(f"  {order_id} ✅ (saved immediately)")
 
                             success_count += 1
-                            if order_id in captured_details:
-                                del captured_details[order_id]
-
-                            # Close modal
-                            try:
-                                await page.click("button.ant-modal-close", timeout=2000)
-                                await page.wait_for_timeout(300)
-                            except:
-                                try:
-                                    await page.keyboard.press("Escape")
-                                    await page.wait_for_timeout(300)
-                                except:
-                                    pass
 
                         except Exception as e:
                             print(f"❌ {str(e)[:40]}")
                             error_count += 1
-                            try:
-                                await page.keyboard.press("Escape")
-                            except:
-                                pass
-
-                    # Early exit logic (only in incremental mode)
-                    if not full_sync and found_old_order and page_number > 1:
-                        recent_skip_ratio = skipped_count / max(
-                            1, (total_scraped + skipped_count)
-                        )
-                        if (
-                            recent_skip_ratio > 0.8
-                        ):  # If >80% of recent orders are being skipped
-                            print(
-                                f"\n  ⏰ High skip ratio ({recent_skip_ratio:.1%}) - likely reached old data, stopping early"
-                            )
-                            break
 
-                            # Next page
+                    # Whole page updated before the month started -> later pages are older still
+                    if (
+                        not full_sync
+                        and page_max_updated is not None
+                        and page_max_updated < created_from_dt
+                    ):
+                        print(
+                            f"\n  ⏰ Page {page_number} last updated {page_max_updated:%d %b %Y} (before month start) - stopping early"
+                        )
+                        break
 
+                    # Next page
                     try:
                         # 1) Read current active page number from UI (source of truth)
                         try:
@@ -1247,27 +1477,8 @@ async def scrape_orders_month(
                             print(f"⚠️ Failed to click Next: {e}")
                             break
 
-                        # 3) Wait for the spinner (if any) to appear then disappear
-                        #    <span class="ant-spin-dot ant-spin-dot-spin">...</span>
-                        try:
-                            await page.wait_for_selector(
-                                "span.ant-spin-dot-spin", timeout=3000
-                            )
-                        except Exception:
-                            # Spinner might be too fast or not shown; ignore
-                            pass
-
-                        try:
-                            await page.wait_for_selector(
-                                "span.ant-spin-dot-spin",
-                                state="detached",
-                                timeout=25000,
-                            )
-                        except Exception:
-                            # If it never attached or stays, we'll still rely on the next step
-                            pass
-
-                        # 4) Wait until the ACTIVE page number equals target_page
+                        # 3) Wait until the ACTIVE page number equals target_page
+                        #    (this is the real "page changed" signal; no need to poll the spinner)
                         try:
                             await page.wait_for_function(
                                 """
@@ -1279,21 +1490,18 @@ async def scrape_orders_month(
                                 }
                                 """,
                                 target_page,
-                                timeout=15000,
+                                timeout=30000,
                             )
                         except Exception:
                             # Tolerate failure; we'll still ensure rows exist
                             pass
 
-                        # 5) Ensure the visible tbody exists again before reading rows
+                        # 4) Ensure the visible tbody exists again before reading rows
                         await page.wait_for_selector(
                             "div.ant-table-content tbody.ant-table-tbody > tr.ant-table-row",
                             timeout=10000,
                         )
 
-                        # Clear captured details so only fresh responses from this page are considered
-                        captured_details.clear()
-
                         # Keep our counter aligned with the UI page number
                         page_number = target_page
                     except Exception:
@@ -1306,12 +1514,20 @@ async def scrape_orders_month(
         except Exception as e:
             print(f"\n💥 CRASH DETECTED: {e}")
             print(
-                f"✅ All successfully scraped data was saved immediately to Google Sheets"
+                f"✅ Scraped data is saved in small batches; buffered rows are flushed below"
             )
             print(f"✅ {success_count} orders were saved before crash")
             # Don't re-raise the exception - let the summary run
 
-        # No need to flush - we save immediately after each successful scrape
+        # Persist whatever is left of the batched sheet rows / checkpoint
+        try:
+            await stop_sheet_writer()
+        except Exception as e:
+            print(f"⚠️ Warning: Could not save buffered rows: {e}")
+        try:
+            flush_checkpoint(force=True)
+        except Exception as e:
+            print(f"⚠️ Warning: Could not write checkpoint: {e}")
 
         # Generate summary for Telegram (counts only, no full data)
         if output_format == "sheets":
@@ -1323,50 +1539,35 @@ async def scrape_orders_month(
                 other_count = 0
                 total_in_sheet = 0
 
-                # Re-read the sheet to count orders
-                all_records = ws.get_all_values()
+                # Re-read only the columns the counters need (order, status, last synced)
+                ranges = []
+                for header in ("Order Number", "Order Status", "Last Synced"):
+                    col = rowcol_to_a1(2, HEADERS.index(header) + 1)[:-1]
+                    ranges.append(f"{col}2:{col}")
+                order_col, status_col, synced_col = await asyncio.to_thread(
+                    ws.batch_get, ranges
+                )
 
-                # Reset counters
-                total_in_sheet = 0
-                new_orders_count = 0
+                # Rows synced by this scraper carry a local "YYYY-MM-DD HH:MM:SS"
+                # Last Synced, so "synced today" is a plain prefix check
+                today_prefix = datetime.now(LOCAL_TZ).date().isoformat()
 
-                for row in all_records[1:]:  # Skip header
-                    if not row:
+                for order_cell, status_cell, synced_cell in zip_longest(
+                    order_col, status_col, synced_col, fillvalue=[]
+                ):
+                    if not (order_cell or status_cell or synced_cell):
                         continue
 
-                    order_status = row[2].strip() if len(row) > 2 and row[2] else ""
-                    last_synced = row[13].strip() if len(row) > 13 and row[13] else ""
+                    order_status = status_cell[0].strip() if status_cell else ""
+                    last_synced = synced_cell[0].strip() if synced_cell else ""
 
                     # Only count rows that have a Last Synced value
                     if last_synced:
                         total_in_sheet += 1
 
                         # Check if this order was just scraped (Last Synced = today)
-                        try:
-                            last_synced_dt = parse_last_synced(last_synced)
-                            if (
-                                last_synced_dt
-                                and last_synced_dt.date()
-                                == datetime.now(LOCAL_TZ).date()
-                            ):
-                                new_orders_count += 1
-                        except Exception:
-                            pass
-
-                    # Check if this order was just scraped (has Last Synced from today)
-                    is_newly_scraped = False
-                    if last_synced:
-                        try:
-                            last_synced_dt = parse_last_synced(last_synced)
-                            if (
-                                last_synced_dt
-                                and last_synced_dt.date()
-                                == datetime.now(LOCAL_TZ).date()
-                            ):
-                                is_newly_scraped = True
-                                new_orders_count += 1
-                        except:
-                            pass
+                        if last_synced.lstrip("'").startswith(today_prefix):
+                            new_orders_count += 1
 
                     # Count by status
                     if order_status == "Completed":
@@ -1423,10 +1624,8 @@ async def scrape_orders_month(
         # Sort the tab by Created Date after scraping (sheets mode only)
         if output_format == "sheets":
             try:
-                from gsheets_writer import sort_tab_by_created_date
-
                 print(f"\n🔄 Sorting tab by Created Date...")
-                sort_tab_by_created_date(ws, descending=True)
+                await asyncio.to_thread(sort_tab_by_created_date, ws, descending=True)
             except Exception as e:
                 print(f"⚠️ Warning: Could not sort tab: {e}")
 
@@ -1485,7 +1684,7 @@ async def scrape_orders_month(
             try:
                 print(f"\n🔍 Running subscriber status check...")
                 # Re-open the worksheet to get fresh data after custId updates
-                ws = spread.worksheet(tab_title)
+                ws = await asyncio.to_thread(spread.worksheet, tab_title)
                 status_result = await check_all_statuses(page, month_text, year, ws, iframe_frame=iframe_frame)
                 print(f"  Status check complete: {status_result.get('checked', 0)} checked, "
                       f"{status_result.get('not_found', 0)} not found, "
@@ -1498,7 +1697,7 @@ async def scrape_orders_month(
             if os.path.exists(checkpoint_file):
                 os.remove(checkpoint_file)
                 print(f"\n✅ Checkpoint removed")
-            print(f"💾 Final CSV: {csv_path} ({len(all_orders)} orders)")
+            print(f"💾 Final CSV: {csv_path} ({csv_row_count} orders)")
 
         # Summary
         summary_title = "FULL CAPTURE SUMMARY" if full_sync else "SMART SYNC SUMMARY"
@@ -1521,7 +1720,7 @@ async def scrape_orders_month(
             print(f"✨ New orders: {total_scraped - updated_count}")
         print(f"✅ Successful: {success_count}")
         print(f"❌ Failed: {error_count}")
-        print(f"💾 Data Safety: Each order saved immediately to Google Sheets")
+        print(f"💾 Data Safety: Orders saved to Google Sheets every {SHEETS_FLUSH_EVERY} orders / {SHEETS_FLUSH_INTERVAL}s")
         print("=" * 70)
 
         result = {
@@ -1539,21 +1738,40 @@ async def scrape_orders_month(
             result["sheet_tab"] = tab_title
         else:
             result["csv_file"] = csv_path
-            result["orders"] = all_orders
+            # Read back once for API callers; the file is the source of truth
+            if csv_file is not None:
+                csv_file.flush()
+            if os.path.exists(csv_path):
+                with open(csv_path, "r", encoding="utf-8", newline="") as f:
+                    result["orders"] = list(csv.DictReader(f))
+            else:
+                result["orders"] = []
 
         return result
 
     finally:
-        # Close the reusable detail page if it was created
+        # Last chance to persist buffered sheet rows if we're unwinding on an error
         try:
-            dp = locals().get("detail_page")
-            if dp and not dp.is_closed():
-                await dp.close()
-        except Exception:
-            pass
-        await context.close()
-        await browser.close()
-        await pw.stop()
+            stop_writer = locals().get("stop_sheet_writer")
+            if stop_writer:
+                await stop_writer()
+            rows_left = locals().get("pending_rows")
+            if rows_left:
+                await asyncio.to_thread(upsert_rows, ws, rows_left)
+        except Exception as e:
+            print(f"⚠️ Warning: Could not save buffered rows: {e}")
+        # Close the CSV output if it was opened
+        cf = locals().get("csv_file")
+        if cf and not cf.closed:
+            cf.close()
+        # Close the pooled detail pages that were opened
+        for dp in locals().get("detail_pages") or []:
+            try:
+                if not dp.is_closed():
+                    await dp.close()
+            except Exception:
+                pass
+        await close_browser(browser, context, pw)
 
 
 # Convenience wrappers
@@ -5,11 +5,13 @@ Async-native version to fix "Event Loop" errors.
 """
 
 import asyncio
+import atexit
 import re
+import threading
 import time
 from datetime import datetime
 
-from telethon import TelegramClient
+from telethon import TelegramClient, events
 
 # ================= CONFIGURATION =================
 # ⚠️ Ensure these match what you used locally to generate the session
@@ -21,21 +23,58 @@ CHAT_ID = -1003215620011
 SESSION_NAME = "sessions/unifi_user_session"
 # =================================================
 
+# "OTP is XXXXXX" / "OTP: XXXXXX" (group 1) or any standalone 6 digits (group 2), in one scan
+_OTP_RX = re.compile(r"OTP(?: is |:\s*)(\d{6})|\b(\d{6})\b", re.IGNORECASE)
+# Both alternatives need digits - chat messages without any skip the OTP scan entirely
+_DIGIT_RX = re.compile(r"\d")
+
+# One connected client per event loop (each api_server thread runs its own asyncio.run),
+# reused across OTP requests made on that loop: loop -> [client or None, asyncio.Lock]
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+async def _get_client() -> TelegramClient:
+    """Return this event loop's client, connecting it on first use."""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        # Loops that have finished can't use (or disconnect) their clients any more
+        for old_loop in [l for l in _clients if l.is_closed()]:
+            del _clients[old_loop]
+        entry = _clients.setdefault(loop, [None, asyncio.Lock()])
+
+    async with entry[1]:
+        client = entry[0]
+        if client is None or not client.is_connected():
+            print(f"👤 Userbot: Connecting to Telegram...")
+            client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+            # Connect (using existing session file)
+            await client.start()
+            entry[0] = client
+        return client
+
+
+@atexit.register
+def _disconnect_at_exit():
+    with _clients_lock:
+        clients = [entry[0] for entry in _clients.values() if entry[0] is not None]
+    for client in clients:
+        if client.loop.is_closed() or client.loop.is_running():
+            continue
+        try:
+            client.disconnect()  # Telethon runs it to completion on the idle loop
+        except Exception:
+            pass
+
 
 async def get_latest_otp(wait_seconds=None, max_wait=1200):
     """
     Waits for a NEW OTP.
     max_wait = 1200 seconds (20 minutes) to handle very slow SMS.
     """
-    print(f"👤 Userbot: Connecting to Telegram...")
-
-    # Initialize Client
-    client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
-
-    # Connect (using existing session file)
-    await client.start()
+    client = await _get_client()
 
-    print(f"👤 Userbot: Connected! Scanning group {CHAT_ID}...")
+    print(f"👤 Userbot: Connected! Watching group {CHAT_ID}...")
 
     # -----------------------------------------------------------
     # THE FIX: Define a "Cutoff Time"
@@ -45,63 +84,61 @@ async def get_latest_otp(wait_seconds=None, max_wait=1200):
     search_start_time = time.time()
     cutoff_timestamp = search_start_time - 15
 
+    found = asyncio.get_running_loop().create_future()
+
+    def _check_message(message):
+        """Resolve `found` with (otp, timestamp) if this is a NEW message carrying an OTP"""
+        if found.done() or not message.date:
+            return
+
+        # Get message timestamp (UTC)
+        msg_timestamp = message.date.timestamp()
+
+        # This message existed before we clicked "GET". Ignore it.
+        if msg_timestamp < cutoff_timestamp:
+            return
+
+        otp = _extract_otp(message.raw_text or "")
+        if otp:
+            found.set_result((otp, msg_timestamp))
+
+    async def _on_new_message(event):
+        _check_message(event.message)
+
+    # Telegram pushes new messages to us - no need to poll get_messages
+    new_message_filter = events.NewMessage(chats=CHAT_ID)
+    client.add_event_handler(_on_new_message, new_message_filter)
+
     print(f"🕒 Waiting for OTP (timeout: {max_wait/60:.0f} mins)...")
 
     try:
-        while time.time() - search_start_time < max_wait:
-            # Get last 10 messages
-            messages = await client.get_messages(CHAT_ID, limit=10)
-
-            for message in messages:
-                if not message.date:
-                    continue
-
-                # Get message timestamp (UTC)
-                msg_timestamp = message.date.timestamp()
-
-                # ------------------------------------------------
-                # LOGIC: Is this message OLDER than our start time?
-                # ------------------------------------------------
-                if msg_timestamp < cutoff_timestamp:
-                    # This message existed before we clicked "GET". Ignore it.
-                    continue
-
-                # If we get here, the message is NEW (arrived after we started)
-                text = message.text or ""
-                otp = _extract_otp(text)
-
-                if otp:
-                    arrival_time = datetime.fromtimestamp(msg_timestamp).strftime(
-                        "%H:%M:%S"
-                    )
-                    print(
-                        f"✅ Userbot Found NEW OTP: {otp} (Arrived at {arrival_time})"
-                    )
-                    return otp
-
-            # Wait 5 seconds before checking again (save CPU)
-            await asyncio.sleep(5)
-
-            # Optional: Print a dot every 30 seconds to show it's still alive
-            if int(time.time()) % 30 == 0:
-                print(".", end="", flush=True)
+        # Catch an OTP that arrived just before the handler was registered
+        for message in await client.get_messages(CHAT_ID, limit=5):
+            _check_message(message)
+
+        otp, msg_timestamp = await asyncio.wait_for(found, timeout=max_wait)
+        arrival_time = datetime.fromtimestamp(msg_timestamp).strftime("%H:%M:%S")
+        print(f"✅ Userbot Found NEW OTP: {otp} (Arrived at {arrival_time})")
+        return otp
 
+    except asyncio.TimeoutError:
+        pass
     except Exception as e:
         print(f"⚠️ Userbot Error: {e}")
     finally:
-        await client.disconnect()
+        client.remove_event_handler(_on_new_message, new_message_filter)
 
     print("\n❌ Userbot Timeout: No NEW OTP received within limit.")
     return None
 
 
 def _extract_otp(text):
-    if not text:
+    if not text or len(text) < 6 or not _DIGIT_RX.search(text):
         return None
-    # Look for "OTP is XXXXXX" or "OTP: XXXXXX"
-    patterns = [r"OTP is (\d{6})", r"OTP:\s*(\d{6})", r"\b(\d{6})\b"]  # Fallback
-    for p in patterns:
-        match = re.search(p, text, re.IGNORECASE)
-        if match:
+    fallback = None
+    for match in _OTP_RX.finditer(text):
+        if match.group(1):
             return match.group(1)
-    return None
+        if fallback is None:
+            fallback = match.group(2)
+    return fallback